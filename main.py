@@ -1,30 +1,144 @@
 import asyncio
-import hashlib
-import hmac
-import json
 import os
+import socket
 from typing import Dict, Any
+from urllib.parse import unquote_to_bytes
 
 import httpx
-from fastapi import FastAPI, Request, HTTPException, Query
-from fastapi.responses import JSONResponse
+import orjson
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import hmac as c_hmac
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 import logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Cameo Webhook Listener", version="1.0.0")
+app = FastAPI(title="Cameo Webhook Listener", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Configuration - these should be set as environment variables
 WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "your-secret-token-here")
+WEBHOOK_SECRET_TOKEN_BYTES = WEBHOOK_SECRET_TOKEN.encode('utf-8')
+
+# Pre-keyed HMAC template: the inner/outer key pads only depend on the
+# secret, so derive them once and reuse via .copy() per request. The
+# cryptography backend is a thin wrapper over OpenSSL's EVP HMAC, which
+# uses SHA-NI on capable CPUs.
+_HMAC_TEMPLATE = c_hmac.HMAC(WEBHOOK_SECRET_TOKEN_BYTES, hashes.SHA256())
 RELAY_URL_1 = os.getenv("RELAY_URL_1", "https://your-destination-url-1.com/webhook")
 RELAY_URL_2 = os.getenv("RELAY_URL_2", "https://your-destination-url-2.com/webhook")
 RELAY_URL_3 = os.getenv("RELAY_URL_3", "https://your-destination-url-3.com/webhook")
 RELAY_TIMEOUT = int(os.getenv("RELAY_TIMEOUT", "30"))
+RELAY_WORKERS = int(os.getenv("RELAY_WORKERS", "4"))
+RELAY_QUEUE_SIZE = int(os.getenv("RELAY_QUEUE_SIZE", "10000"))
+
+# Collect configured relay URLs, skipping unset or placeholder values so
+# dead destinations never receive POSTs, pre-paired with 1-based indices
+RELAY_URLS = tuple(
+    url for url in (RELAY_URL_1, RELAY_URL_2, RELAY_URL_3)
+    if url and not url.startswith("https://your-destination-url-")
+)
+_INDEXED_RELAYS = tuple(enumerate(RELAY_URLS, 1))
+
+# (name, configured url, placeholder default) per relay slot, used by
+# the status endpoint
+_RELAY_DEFS = tuple(zip(
+    ("url_1", "url_2", "url_3"),
+    (RELAY_URL_1, RELAY_URL_2, RELAY_URL_3),
+    (
+        "https://your-destination-url-1.com/webhook",
+        "https://your-destination-url-2.com/webhook",
+        "https://your-destination-url-3.com/webhook"
+    )
+))
+
+# Constant header dicts, built once instead of per request
+_OUT_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "Cameo-Webhook-Relay/1.0"
+}
+_HEADER_TEMPLATE = {"Content-Type": "application/json"}
+
+def _msg_from_query(query_string: bytes):
+    """
+    Extract the msg parameter from a raw query string as bytes.
 
-# Collect all relay URLs
-RELAY_URLS = [RELAY_URL_1, RELAY_URL_2, RELAY_URL_3]
+    stdlib parse_qs round-trips bytes input through str with strict
+    ASCII, which blows up on percent-encoded UTF-8, so decode the value
+    entirely in bytes. Returns None if msg is absent.
+    """
+    for pair in query_string.split(b'&'):
+        name, sep, value = pair.partition(b'=')
+        if name == b'msg' and sep:
+            return unquote_to_bytes(value.replace(b'+', b' '))
+    return None
+
+async def relay_worker(queue: asyncio.Queue, client: httpx.AsyncClient):
+    """
+    Background worker that drains the relay queue.
+
+    Relay failures are logged and swallowed, matching the previous
+    behaviour of returning 200 to drchrono regardless of relay outcome.
+    """
+    while True:
+        url_index, relay_url, payload = await queue.get()
+        try:
+            response = await client.post(
+                relay_url,
+                content=payload,
+                headers=_OUT_HEADERS
+            )
+            logger.info("Relay to URL %d response status: %d", url_index, response.status_code)
+        except httpx.TimeoutException:
+            logger.error("Timeout while relaying to URL %d: %s", url_index, relay_url)
+        except httpx.RequestError as e:
+            logger.error("Request error while relaying to URL %d: %s", url_index, e)
+        except Exception as e:
+            logger.error("Unexpected error while relaying to URL %d: %s", url_index, e)
+        finally:
+            queue.task_done()
+
+@app.on_event("startup")
+async def startup_event():
+    """Create a single shared HTTP client so connections are reused across webhooks"""
+    limits = httpx.Limits(
+        max_keepalive_connections=100,
+        max_connections=200,
+        keepalive_expiry=30
+    )
+    # TCP_NODELAY so small relay POSTs are sent immediately instead of
+    # waiting out Nagle's algorithm
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=limits,
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+    )
+    app.state.client = httpx.AsyncClient(
+        timeout=RELAY_TIMEOUT,
+        transport=transport
+    )
+    # Warm up DNS and the connection pool so TCP+TLS are already
+    # established when the first webhook arrives; failures here are
+    # harmless and just mean a cold first relay.
+    await asyncio.gather(
+        *(app.state.client.head(url) for url in RELAY_URLS),
+        return_exceptions=True
+    )
+    app.state.queue = asyncio.Queue(maxsize=RELAY_QUEUE_SIZE)
+    app.state.workers = [
+        asyncio.create_task(relay_worker(app.state.queue, app.state.client))
+        for _ in range(RELAY_WORKERS)
+    ]
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the relay workers and close the shared HTTP client"""
+    for worker in app.state.workers:
+        worker.cancel()
+    await asyncio.gather(*app.state.workers, return_exceptions=True)
+    await app.state.client.aclose()
 
 @app.get("/")
 async def health_check():
@@ -32,32 +146,40 @@ async def health_check():
     return {"status": "healthy", "message": "Cameo Webhook Listener is running"}
 
 @app.get("/webhook")
-async def webhook_verification(msg: str = Query(..., description="Verification message from drchrono")):
+async def webhook_verification(request: Request):
     """
     Webhook verification endpoint for drchrono webhooks.
-    
+
     This endpoint handles the GET request sent during webhook verification.
     It uses HMAC-SHA256 to hash the provided message with the secret token.
     """
+    # Read msg straight from the raw query string so the bytes are hashed
+    # as received, skipping Starlette's str decode and our re-encode
+    msg = _msg_from_query(request.scope["query_string"])
+    if msg is None:
+        raise HTTPException(status_code=422, detail="Query parameter 'msg' is required")
+    if not 1 <= len(msg) <= 256:
+        raise HTTPException(status_code=422, detail="Query parameter 'msg' must be 1-256 bytes")
+
     try:
-        logger.info(f"Webhook verification requested with msg: {msg}")
-        
-        # Generate HMAC-SHA256 hash of the message using the secret token
-        secret_token = hmac.new(
-            WEBHOOK_SECRET_TOKEN.encode('utf-8'), 
-            msg.encode('utf-8'), 
-            hashlib.sha256
-        ).hexdigest()
+        logger.debug("Webhook verification requested with msg: %s", msg)
+
+        # Generate HMAC-SHA256 hash of the message using the secret token.
+        # Copying the pre-keyed template skips re-deriving the key pads
+        # on every request.
+        h = _HMAC_TEMPLATE.copy()
+        h.update(msg)
+        secret_token = h.finalize().hex()
         
-        logger.info("Webhook verification successful")
+        logger.debug("Webhook verification successful")
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={"secret_token": secret_token}
         )
         
     except Exception as e:
-        logger.error(f"Webhook verification failed: {str(e)}")
+        logger.error("Webhook verification failed: %s", e)
         raise HTTPException(status_code=500, detail="Verification failed")
 
 @app.post("/webhook")
@@ -72,113 +194,55 @@ async def webhook_handler(request: Request):
     4. Returns appropriate response
     """
     try:
-        # Extract headers
-        headers = dict(request.headers)
-        
-        # Log webhook details
-        drchrono_event = headers.get("x-drchrono-event", "unknown")
-        drchrono_signature = headers.get("x-drchrono-signature", "")
-        drchrono_delivery = headers.get("x-drchrono-delivery", "")
+        # Read the drchrono headers directly; request.headers already
+        # supports case-insensitive lookup without copying the full map
+        drchrono_event = request.headers.get("x-drchrono-event", "unknown")
+        drchrono_signature = request.headers.get("x-drchrono-signature", "")
+        drchrono_delivery = request.headers.get("x-drchrono-delivery", "")
         
-        logger.info(f"Received webhook - Event: {drchrono_event}, Delivery: {drchrono_delivery}")
+        logger.info("Received webhook - Event: %s, Delivery: %s", drchrono_event, drchrono_delivery)
         
-        # Get the request body
+        # Get the request body; it is forwarded verbatim so only validate
+        # that it is JSON instead of parsing and re-serializing it for
+        # each relay
         body = await request.body()
-        
-        # Parse JSON body if it exists
-        try:
-            json_body = await request.json() if body else {}
-        except json.JSONDecodeError:
-            json_body = {}
-            logger.warning("Failed to parse JSON body")
-        
-        # Prepare relay data
-        relay_data = {
-            "headers": {
-                "X-drchrono-event": drchrono_event,
-                "X-drchrono-signature": drchrono_signature,
-                "X-drchrono-delivery": drchrono_delivery,
-                "Content-Type": "application/json"
-            },
-            "body": json_body
-        }
-        
-        # Relay the webhook data to all destination URLs
-        async with httpx.AsyncClient(timeout=RELAY_TIMEOUT) as client:
-            relay_results = []
-            
-            # Send to all relay URLs concurrently
-            tasks = []
-            for i, relay_url in enumerate(RELAY_URLS, 1):
-                logger.info(f"Preparing to relay webhook data to URL {i}: {relay_url}")
-                task = client.post(
-                    relay_url,
-                    json=relay_data,
-                    headers={
-                        "Content-Type": "application/json",
-                        "User-Agent": "Cameo-Webhook-Relay/1.0"
-                    }
-                )
-                tasks.append(task)
-            
-            # Wait for all relay requests to complete
-            responses = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Process results
-            for i, response in enumerate(responses, 1):
-                if isinstance(response, Exception):
-                    logger.error(f"Relay to URL {i} failed: {str(response)}")
-                    relay_results.append({
-                        "url_index": i,
-                        "url": RELAY_URLS[i-1],
-                        "status": "error",
-                        "error": str(response)
-                    })
-                else:
-                    logger.info(f"Relay to URL {i} response status: {response.status_code}")
-                    relay_results.append({
-                        "url_index": i,
-                        "url": RELAY_URLS[i-1],
-                        "status": "success",
-                        "status_code": response.status_code
-                    })
-            
-            # Return success response to drchrono with all relay statuses
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "status": "success",
-                    "message": "Webhook received and relayed to all destinations",
-                    "relay_results": relay_results,
-                    "event": drchrono_event,
-                    "delivery_id": drchrono_delivery
-                }
-            )
-            
-    except httpx.TimeoutException:
-        logger.error(f"Timeout while relaying to one or more URLs")
-        # Still return 200 to drchrono to avoid retries
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "timeout",
-                "message": "Webhook received but relay timed out"
-            }
-        )
-        
-    except httpx.RequestError as e:
-        logger.error(f"Request error while relaying: {str(e)}")
-        # Still return 200 to drchrono to avoid retries
-        return JSONResponse(
+        if body:
+            try:
+                orjson.loads(body)
+            except orjson.JSONDecodeError:
+                body = b'{}'
+                logger.warning("Failed to parse JSON body")
+        else:
+            body = b'{}'
+
+        # Build the relay payload once and share the same bytes object
+        # across all destination POSTs
+        relay_headers = dict(_HEADER_TEMPLATE)
+        relay_headers["X-drchrono-event"] = drchrono_event
+        relay_headers["X-drchrono-signature"] = drchrono_signature
+        relay_headers["X-drchrono-delivery"] = drchrono_delivery
+        payload = b'{"headers":' + orjson.dumps(relay_headers) + b',"body":' + body + b'}'
+
+        # Enqueue the webhook data for all destination URLs; the background
+        # workers handle the outbound POSTs so the response is not blocked
+        # on the slowest relay.
+        for i, relay_url in _INDEXED_RELAYS:
+            logger.debug("Queueing webhook data for URL %d: %s", i, relay_url)
+            await app.state.queue.put((i, relay_url, payload))
+
+        # Return success response to drchrono immediately
+        return ORJSONResponse(
             status_code=200,
             content={
-                "status": "error",
-                "message": "Webhook received but relay failed"
+                "status": "success",
+                "message": "Webhook received and queued for relay to all destinations",
+                "event": drchrono_event,
+                "delivery_id": drchrono_delivery
             }
         )
-        
+
     except Exception as e:
-        logger.error(f"Unexpected error in webhook handler: {str(e)}")
+        logger.error("Unexpected error in webhook handler: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/webhook/status")
@@ -189,18 +253,8 @@ async def webhook_status():
     return {
         "webhook_secret_configured": bool(WEBHOOK_SECRET_TOKEN and WEBHOOK_SECRET_TOKEN != "your-secret-token-here"),
         "relay_urls": {
-            "url_1": {
-                "configured": bool(RELAY_URL_1 and RELAY_URL_1 != "https://your-destination-url-1.com/webhook"),
-                "url": RELAY_URL_1
-            },
-            "url_2": {
-                "configured": bool(RELAY_URL_2 and RELAY_URL_2 != "https://your-destination-url-2.com/webhook"),
-                "url": RELAY_URL_2
-            },
-            "url_3": {
-                "configured": bool(RELAY_URL_3 and RELAY_URL_3 != "https://your-destination-url-3.com/webhook"),
-                "url": RELAY_URL_3
-            }
+            name: {"configured": bool(url) and url != default, "url": url}
+            for name, url, default in _RELAY_DEFS
         },
         "relay_timeout": RELAY_TIMEOUT
     }
@@ -208,4 +262,13 @@ async def webhook_status():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", "8000"))
-    uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+        log_level="warning",
+        access_log=False
+    ) 
\ No newline at end of file